@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
+# pylint: disable=too-many-lines
 """
 Resmoke Test Suite Generator.
 
 Analyze the evergreen history for tests run under the given task and create new evergreen tasks
 to attempt to keep the task runtime under a specified amount.
 """
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 from datetime import timedelta
+from functools import lru_cache
+import heapq
 from inspect import getframeinfo, currentframe
 import logging
 import math
@@ -15,13 +18,18 @@ import os
 import re
 import sys
 from distutils.util import strtobool  # pylint: disable=no-name-in-module
-from typing import Dict, List, Set, Sequence, Optional, Any, Match
+from typing import Dict, List, Set, Sequence, Optional, Any, Pattern
 
 import click
 import requests
 import structlog
 import yaml
 
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper  # type: ignore
+
 from evergreen.api import EvergreenApi, RetryingEvergreenApi
 from evergreen.stats import TestStats
 
@@ -34,7 +42,7 @@ if __name__ == "__main__" and __package__ is None:
 # pylint: disable=wrong-import-position
 import buildscripts.resmokelib.parser as _parser
 import buildscripts.resmokelib.suitesconfig as suitesconfig
-from buildscripts.util.fileops import write_file_to_dir
+from buildscripts.util.fileops import write_file
 import buildscripts.util.read_config as read_config
 import buildscripts.util.taskname as taskname
 import buildscripts.util.teststats as teststats
@@ -50,6 +58,9 @@ MIN_TIMEOUT_SECONDS = int(timedelta(minutes=5).total_seconds())
 MAX_EXPECTED_TIMEOUT = int(timedelta(hours=48).total_seconds())
 LOOKBACK_DURATION_DAYS = 14
 GEN_SUFFIX = "_gen"
+GEN_SUFFIX_LEN = len(GEN_SUFFIX)
+MAX_SUITES_FOR_DIFFERENCING = 4
+MAX_FILE_IO_WORKERS = 32
 
 HEADER_TEMPLATE = """# DO NOT EDIT THIS FILE. All manual edits will be lost.
 # This file was generated by {file} from
@@ -101,6 +112,7 @@ class ConfigOptions(object):
         self.required_keys = required_keys if required_keys else set()
         self.default_values = defaults if defaults else {}
         self.formats = formats if formats else {}
+        self._lookup_cache = {}
 
     @classmethod
     def from_file(cls, filepath, required_keys, defaults, formats):
@@ -191,7 +203,11 @@ class ConfigOptions(object):
 
     def __getattr__(self, item):
         """Determine the value of the given attribute."""
-        return self._lookup(self.config, item)
+        # The configuration does not change once it is read, so each lookup only needs to be
+        # formatted once.
+        if item not in self._lookup_cache:
+            self._lookup_cache[item] = self._lookup(self.config, item)
+        return self._lookup_cache[item]
 
     def __repr__(self):
         """Provide a string representation of this object for debugging."""
@@ -223,8 +239,33 @@ def write_file_dict(directory: str, file_dict: Dict[str, str]) -> None:
     :param directory: Directory to write files to.
     :param file_dict: Dictionary of files to write.
     """
-    for name, contents in file_dict.items():
-        write_file_to_dir(directory, name, contents)
+    if not file_dict:
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    # Writing files is dominated by blocking I/O, so the writes can overlap across threads.
+    with ThreadPoolExecutor(max_workers=min(MAX_FILE_IO_WORKERS, len(file_dict))) as executor:
+        futures = [
+            executor.submit(write_file, os.path.join(directory, name), contents)
+            for name, contents in file_dict.items()
+        ]
+    for future in futures:
+        future.result()
+
+
+def existing_paths(paths: Set[str]) -> Set[str]:
+    """
+    Find which of the given paths exist.
+
+    :param paths: Paths to check.
+    :return: Set of the given paths that exist.
+    """
+    if not paths:
+        return set()
+
+    # Checking paths is dominated by blocking stat calls, so the checks can overlap across threads.
+    with ThreadPoolExecutor(max_workers=min(MAX_FILE_IO_WORKERS, len(paths))) as executor:
+        return {path for path, exists in zip(paths, executor.map(os.path.exists, paths)) if exists}
 
 
 def read_yaml(directory: str, filename: str) -> Dict:
@@ -249,7 +290,7 @@ def split_if_exists(str_to_split):
 def remove_gen_suffix(task_name):
     """Remove '_gen' suffix from task_name."""
     if task_name.endswith(GEN_SUFFIX):
-        return task_name[:-4]
+        return task_name[:-GEN_SUFFIX_LEN]
     return task_name
 
 
@@ -264,17 +305,6 @@ def string_contains_any_of_args(string, args):
     return any(arg in string for arg in args)
 
 
-def divide_remaining_tests_among_suites(remaining_tests_runtimes, suites):
-    """Divide the list of tests given among the suites given."""
-    suite_idx = 0
-    for test_file, runtime in remaining_tests_runtimes:
-        current_suite = suites[suite_idx]
-        current_suite.add_test(test_file, runtime)
-        suite_idx += 1
-        if suite_idx >= len(suites):
-            suite_idx = 0
-
-
 def _new_suite_needed(current_suite, test_runtime, max_suite_runtime, max_tests_per_suite):
     """
     Check if a new suite should be created for the given suite.
@@ -296,16 +326,60 @@ def _new_suite_needed(current_suite, test_runtime, max_suite_runtime, max_tests_
     return False
 
 
+def _kk_partition(tests_runtimes, num_partitions):
+    """
+    Partition the given tests using the Karmarkar-Karp largest differencing method.
+
+    Each test starts as a partial partition with the test in one subset and all other subsets
+    empty. The two partial partitions with the largest spread between their biggest and smallest
+    subsets are repeatedly merged, combining the biggest subsets of one with the smallest subsets
+    of the other, until a single partition remains.
+
+    :param tests_runtimes: List of tuples containing test names and test runtimes.
+    :param num_partitions: Number of subsets to divide the tests into.
+    :return: List of subsets, each a list of (test name, runtime) tuples.
+    """
+    # Heap of (-spread, counter, partition) where each partition is a list of
+    # (runtime, tests) subsets sorted by descending runtime.
+    heap = []
+    for counter, (test_file, runtime) in enumerate(tests_runtimes):
+        partition = [(runtime, [(test_file, runtime)])] + [(0, [])] * (num_partitions - 1)
+        heap.append((-runtime, counter, partition))
+    heapq.heapify(heap)
+
+    counter = len(heap)
+    while len(heap) > 1:
+        _, _, largest = heapq.heappop(heap)
+        _, _, second = heapq.heappop(heap)
+        merged = [(l_runtime + s_runtime, l_tests + s_tests)
+                  for (l_runtime, l_tests), (s_runtime, s_tests) in zip(largest, reversed(second))]
+        merged.sort(key=lambda subset: subset[0], reverse=True)
+        heapq.heappush(heap, (merged[-1][0] - merged[0][0], counter, merged))
+        counter += 1
+
+    if not heap:
+        return []
+    _, _, partition = heap[0]
+    return [tests for _, tests in partition]
+
+
 def divide_tests_into_suites(suite_name, tests_runtimes, max_time_seconds, max_suites=None,
                              max_tests_per_suite=None):
     """
     Divide the given tests into suites.
 
+    Tests are assigned longest runtime first, each test going to the suite with the smallest
+    runtime that can still accept it. A new suite is only created when no existing suite can
+    accept the test. This keeps the runtime of the longest suite, which bounds the runtime of the
+    generated task, as small as possible.
+
     Each suite should be able to execute in less than the max time specified. If a single
     test has a runtime greater than `max_time_seconds`, it will be run in a suite on its own.
 
-    If max_suites is reached before assigning all tests to a suite, the remaining tests will be
-    divided up among the created suites.
+    If max_suites is reached before assigning all tests to a suite, each remaining test will be
+    added to the suite with the smallest runtime. When max_suites is small, the tests are instead
+    divided among max_suites suites with the Karmarkar-Karp differencing method, which gives more
+    even suites than assigning the remaining tests greedily.
 
     Note: If `max_suites` is hit, suites may have more tests than `max_tests_per_suite` and may have
     runtimes longer than `max_time_seconds`.
@@ -318,39 +392,121 @@ def divide_tests_into_suites(suite_name, tests_runtimes, max_time_seconds, max_s
     :return: List of Suite objects representing grouping of tests.
     """
     suites = []
+    # Heap of (runtime, index, suite) for the suites that can still have tests added to them.
+    open_suites = []
     Suite.reset_current_index()
-    current_suite = Suite(suite_name)
-    last_test_processed = len(tests_runtimes)
+    sorted_tests_runtimes = sorted(tests_runtimes, key=lambda test: test[1], reverse=True)
+    last_test_processed = len(sorted_tests_runtimes)
     LOGGER.debug("Determines suites for runtime", max_runtime_seconds=max_time_seconds,
                  max_suites=max_suites, max_tests_per_suite=max_tests_per_suite)
-    for idx, (test_file, runtime) in enumerate(tests_runtimes):
-        LOGGER.debug("Adding test", test=test_file, test_runtime=runtime)
-        if _new_suite_needed(current_suite, runtime, max_time_seconds, max_tests_per_suite):
-            LOGGER.debug("Finished suite", suite_runtime=current_suite.get_runtime(),
-                         test_runtime=runtime, max_time=max_time_seconds)
-            if current_suite.get_test_count() > 0:
-                suites.append(current_suite)
-                current_suite = Suite(suite_name)
-                if max_suites and len(suites) >= max_suites:
-                    last_test_processed = idx
-                    break
+    for idx, (test_file, runtime) in enumerate(sorted_tests_runtimes):
+        if open_suites and not _new_suite_needed(open_suites[0][2], runtime, max_time_seconds,
+                                                 max_tests_per_suite):
+            _, _, current_suite = heapq.heappop(open_suites)
+        elif max_suites and len(suites) >= max_suites:
+            if max_suites <= MAX_SUITES_FOR_DIFFERENCING:
+                return _divide_tests_by_differencing(suite_name, sorted_tests_runtimes, max_suites)
+            last_test_processed = idx
+            break
+        else:
+            current_suite = Suite(suite_name)
+            suites.append(current_suite)
 
         current_suite.add_test(test_file, runtime)
+        if not max_tests_per_suite or current_suite.get_test_count() < max_tests_per_suite:
+            heapq.heappush(open_suites,
+                           (current_suite.get_runtime(), current_suite.index, current_suite))
+
+    if last_test_processed < len(sorted_tests_runtimes):
+        # We hit the max suite limit, add the remaining tests to the smallest suites.
+        LOGGER.debug("Max suites reached, dividing remaining tests", max_suites=max_suites)
+        all_suites = [(suite.get_runtime(), suite.index, suite) for suite in suites]
+        heapq.heapify(all_suites)
+        for test_file, runtime in sorted_tests_runtimes[last_test_processed:]:
+            _, index, current_suite = all_suites[0]
+            current_suite.add_test(test_file, runtime)
+            heapq.heapreplace(all_suites, (current_suite.get_runtime(), index, current_suite))
+
+    return name_suites(suites)
+
+
+def _divide_tests_by_differencing(suite_name, tests_runtimes, num_suites):
+    """
+    Divide the given tests into the given number of suites using the differencing method.
 
-    if current_suite.get_test_count() > 0:
-        suites.append(current_suite)
+    :param suite_name: Name of suite being split.
+    :param tests_runtimes: List of tuples containing test names and test runtimes.
+    :param num_suites: Number of suites to create.
+    :return: List of Suite objects representing grouping of tests.
+    """
+    LOGGER.debug("Dividing tests by differencing", num_suites=num_suites)
+    Suite.reset_current_index()
+    suites = []
+    for partition in _kk_partition(tests_runtimes, num_suites):
+        if partition:
+            suite = Suite(suite_name)
+            for test_file, runtime in partition:
+                suite.add_test(test_file, runtime)
+            suites.append(suite)
+    return name_suites(suites)
 
-    if max_suites and last_test_processed < len(tests_runtimes):
-        # We must have hit the max suite limit, just randomly add the remaining tests to suites.
-        divide_remaining_tests_among_suites(tests_runtimes[last_test_processed:], suites)
 
+def name_suites(suites):
+    """
+    Name the given suites now that the total number of suites is known.
+
+    :param suites: List of all suites being generated.
+    :return: The given list of suites.
+    """
+    for suite in suites:
+        suite.set_name(len(suites))
     return suites
 
 
+def _copy_for_selector_update(suite_config):
+    """
+    Copy the given suite config so that its selector can be updated.
+
+    Only the top level and the selector are copied; all other values are shared with the given
+    config and must not be modified.
+
+    :param suite_config: Suite config to copy.
+    :return: Copy of suite config with its own selector.
+    """
+    return {**suite_config, "selector": {**suite_config["selector"]}}
+
+
+@lru_cache(maxsize=None)
+def _get_header(suite_file):
+    """
+    Get the header to add to generated suite files.
+
+    :param suite_file: Name of the suite the files are generated from.
+    :return: Header for generated suite files.
+    """
+    return HEADER_TEMPLATE.format(file=__file__, suite_file=suite_file)
+
+
+def _dump_suite_config(suite_config):
+    """
+    Dump the given suite config to yaml.
+
+    The libyaml emitter is used when it is available since it is much faster than the pure
+    python one.
+
+    :param suite_config: Suite config to dump.
+    :return: Yaml representation of the suite config.
+    """
+    return yaml.dump(suite_config, Dumper=SafeDumper, default_flow_style=False)
+
+
 def update_suite_config(suite_config, roots=None, excludes=None):
     """
     Update suite config based on the roots and excludes passed in.
 
+    Only the selector of the suite config is modified, and lists in it are replaced rather than
+    modified in place.
+
     :param suite_config: suite_config to update.
     :param roots: new roots to run, or None if roots should not be updated.
     :param excludes: excludes to add, or None if excludes should not be include.
@@ -364,7 +520,8 @@ def update_suite_config(suite_config, roots=None, excludes=None):
         # create it.
         if "exclude_files" in suite_config["selector"] and \
                 suite_config["selector"]["exclude_files"]:
-            suite_config["selector"]["exclude_files"] += excludes
+            suite_config["selector"]["exclude_files"] = \
+                suite_config["selector"]["exclude_files"] + excludes
         else:
             suite_config["selector"]["exclude_files"] = excludes
     else:
@@ -387,10 +544,10 @@ def generate_resmoke_suite_config(source_config, source_file, roots=None, exclud
     :param roots: Roots used to select tests for split suite.
     :param excludes: Tests that should be excluded from split suite.
     """
-    suite_config = update_suite_config(deepcopy(source_config), roots, excludes)
+    suite_config = update_suite_config(_copy_for_selector_update(source_config), roots, excludes)
 
-    contents = HEADER_TEMPLATE.format(file=__file__, suite_file=source_file)
-    contents += yaml.safe_dump(suite_config, default_flow_style=False)
+    contents = _get_header(source_file)
+    contents += _dump_suite_config(suite_config)
     return contents
 
 
@@ -450,13 +607,10 @@ def should_tasks_be_generated(evg_api, task_id):
     :return: Boolean of whether to generate tasks.
     """
     task = evg_api.task_by_id(task_id, fetch_all_executions=True)
-    # If any previous execution was successful, do not generate more tasks.
-    for i in range(task.execution):
-        task_execution = task.get_execution(i)
-        if task_execution.is_success():
-            return False
-
-    return True
+    # All executions were fetched with the task, so checking them does not need to call
+    # evergreen again. If any previous execution was successful, do not generate more tasks.
+    previous_executions = (task.get_execution(i) for i in range(task.execution))
+    return not any(execution and execution.is_success() for execution in previous_executions)
 
 
 class Suite(object):
@@ -475,6 +629,7 @@ class Suite(object):
         self.max_runtime = 0
         self.tests_with_runtime_info = 0
         self.source_name = source_name
+        self.name = None
 
         self.index = Suite._current_index
         Suite._current_index += 1
@@ -490,11 +645,10 @@ class Suite(object):
         self.tests.append(test_file)
         self.total_runtime += runtime
 
-        if runtime != 0:
+        if runtime:
             self.tests_with_runtime_info += 1
-
-        if runtime > self.max_runtime:
-            self.max_runtime = runtime
+            if runtime > self.max_runtime:
+                self.max_runtime = runtime
 
     def should_overwrite_timeout(self):
         """
@@ -514,10 +668,13 @@ class Suite(object):
 
         return len(self.tests)
 
-    @property
-    def name(self) -> str:
-        """Get the name of this suite."""
-        return taskname.name_generated_task(self.source_name, self.index, Suite._current_index)
+    def set_name(self, total_suites: int) -> None:
+        """
+        Set the name of this suite.
+
+        :param total_suites: Total number of suites being generated.
+        """
+        self.name = taskname.name_generated_task(self.source_name, self.index, total_suites)
 
     def generate_resmoke_config(self, source_config: Dict) -> str:
         """
@@ -526,9 +683,10 @@ class Suite(object):
         :param source_config: Resmoke config to base generate config on.
         :return: Resmoke config to run this suite.
         """
-        suite_config = update_suite_config(deepcopy(source_config), roots=self.tests)
-        contents = HEADER_TEMPLATE.format(file=__file__, suite_file=self.source_name)
-        contents += yaml.safe_dump(suite_config, default_flow_style=False)
+        suite_config = update_suite_config(
+            _copy_for_selector_update(source_config), roots=self.tests)
+        contents = _get_header(self.source_name)
+        contents += _dump_suite_config(suite_config)
         return contents
 
 
@@ -549,6 +707,7 @@ class EvergreenConfigGenerator(object):
         self.task_specs = []
         self.task_names = []
         self.build_tasks = None
+        self._dependencies = None
 
     def _get_distro(self) -> Optional[Sequence[str]]:
         """Get the distros that the tasks should be run on."""
@@ -633,15 +792,14 @@ class EvergreenConfigGenerator(object):
         return TimeoutInfo.default_timeout()
 
     @staticmethod
-    def _is_task_dependency(task: str, possible_dependency: str) -> Optional[Match[str]]:
+    def _task_dependency_pattern(task: str) -> Pattern[str]:
         """
-        Determine if the given possible_dependency belongs to the given task.
+        Get a pattern matching the sub tasks that belong to the given task.
 
         :param task: Name of dependency being checked.
-        :param possible_dependency: Task to check if dependency.
-        :return: None is task is not a dependency.
+        :return: Compiled pattern matching sub tasks of the given task.
         """
-        return re.match(f"{task}_(\\d|misc)", possible_dependency)
+        return re.compile(f"{re.escape(task)}_(\\d|misc)")
 
     def _get_tasks_for_depends_on(self, dependent_task: str) -> List[str]:
         """
@@ -650,23 +808,27 @@ class EvergreenConfigGenerator(object):
         :param dependent_task: Dependency to check.
         :return: List of tasks that are a part of the given dependency.
         """
+        dependency_pattern = self._task_dependency_pattern(dependent_task)
         return [
             str(task.display_name) for task in self.build_tasks
-            if self._is_task_dependency(dependent_task, str(task.display_name))
+            if dependency_pattern.match(str(task.display_name))
         ]
 
     def _get_dependencies(self) -> Set[TaskDependency]:
         """Get the set of dependency tasks for these suites."""
-        dependencies = {TaskDependency("compile")}
-        if not self.options.is_patch:
-            # Don"t worry about task dependencies in patch builds, only mainline.
-            if self.options.depends_on:
-                for dep in self.options.depends_on:
-                    depends_on_tasks = self._get_tasks_for_depends_on(dep)
-                    for dependency in depends_on_tasks:
-                        dependencies.add(TaskDependency(dependency))
-
-        return dependencies
+        if self._dependencies is None:
+            # The dependencies are the same for every sub task, so only scan the build tasks once.
+            dependencies = {TaskDependency("compile")}
+            if not self.options.is_patch:
+                # Don"t worry about task dependencies in patch builds, only mainline.
+                if self.options.depends_on:
+                    for dep in self.options.depends_on:
+                        depends_on_tasks = self._get_tasks_for_depends_on(dep)
+                        for dependency in depends_on_tasks:
+                            dependencies.add(TaskDependency(dependency))
+            self._dependencies = dependencies
+
+        return set(self._dependencies)
 
     def _generate_task(self, sub_suite_name: str, sub_task_name: str, target_dir: str,
                        max_test_runtime: Optional[int] = None,
@@ -698,27 +860,34 @@ class EvergreenConfigGenerator(object):
 
         return Task(sub_task_name, commands, self._get_dependencies())
 
-    def _create_sub_task(self, idx: int, suite: Suite) -> Task:
+    def _create_sub_task(self, sub_task_name: str, suite: Suite, target_dir: str) -> Task:
         """
         Create the sub task for the given suite.
 
-        :param idx: Index of suite to created.
+        :param sub_task_name: Name of task to create.
         :param suite: Suite to create.
+        :param target_dir: Directory containing generated suite files.
         :return: Shrub configuration for the suite.
         """
-        sub_task_name = taskname.name_generated_task(self.options.task, idx, len(self.suites),
-                                                     self.options.variant)
         max_runtime = None
         total_runtime = None
         if suite.should_overwrite_timeout():
             max_runtime = suite.max_runtime
             total_runtime = suite.get_runtime()
-        return self._generate_task(suite.name, sub_task_name, self.options.generated_config_dir,
-                                   max_runtime, total_runtime)
+        return self._generate_task(suite.name, sub_task_name, target_dir, max_runtime,
+                                   total_runtime)
 
     def _generate_all_tasks(self) -> Set[Task]:
         """Get a set of shrub task for all the sub tasks."""
-        tasks = {self._create_sub_task(idx, suite) for idx, suite in enumerate(self.suites)}
+        task = self.options.task
+        variant = self.options.variant
+        num_suites = len(self.suites)
+        target_dir = self.options.generated_config_dir
+        tasks = {
+            self._create_sub_task(
+                taskname.name_generated_task(task, idx, num_suites, variant), suite, target_dir)
+            for idx, suite in enumerate(self.suites)
+        }
 
         if self.options.create_misc_suite:
             # Add the misc suite
@@ -737,6 +906,7 @@ class EvergreenConfigGenerator(object):
         :param build_variant: Build variant to add generated configuration to.
         """
         self.build_tasks = self.evg_api.tasks_by_build(self.options.build_id)
+        self._dependencies = None
 
         tasks = self._generate_all_tasks()
         generating_task = {ExistingTask(task_name) for task_name in self.options.gen_task_set}
@@ -758,6 +928,7 @@ class GenerateSubSuites(object):
         self.evergreen_api = evergreen_api
         self.config_options = config_options
         self.test_list = []
+        self._suite_tests = None
 
         # Populate config values for methods like list_tests()
         _parser.set_options()
@@ -846,11 +1017,10 @@ class GenerateSubSuites(object):
     def filter_existing_tests(self, tests_runtimes: List[teststats.TestRuntime]) \
             -> List[teststats.TestRuntime]:
         """Filter out tests that do not exist in the filesystem."""
-        all_tests = [teststats.normalize_test_name(test) for test in self.list_tests()]
-        return [
-            info for info in tests_runtimes
-            if os.path.exists(info.test_name) and info.test_name in all_tests
-        ]
+        all_tests = {teststats.normalize_test_name(test) for test in self.list_tests()}
+        suite_tests = {info.test_name for info in tests_runtimes if info.test_name in all_tests}
+        existing_tests = existing_paths(suite_tests)
+        return [info for info in tests_runtimes if info.test_name in existing_tests]
 
     def calculate_fallback_suites(self) -> List[Suite]:
         """Divide tests into a fixed number of suites."""
@@ -859,14 +1029,17 @@ class GenerateSubSuites(object):
         self.test_list = self.list_tests()
         num_suites = min(self.config_options.fallback_num_sub_suites, len(self.test_list),
                          self.config_options.max_sub_suites)
+        Suite.reset_current_index()
         suites = [Suite(self.config_options.suite) for _ in range(num_suites)]
         for idx, test_file in enumerate(self.test_list):
             suites[idx % num_suites].add_test(test_file, 0)
-        return suites
+        return name_suites(suites)
 
     def list_tests(self) -> List[Dict]:
         """List the test files that are part of the suite being split."""
-        return suitesconfig.get_suite(self.config_options.suite).tests
+        if self._suite_tests is None:
+            self._suite_tests = suitesconfig.get_suite(self.config_options.suite).tests
+        return self._suite_tests
 
     def add_suites_to_build_variant(self, suites: List[Suite], build_variant: BuildVariant) -> None:
         """
@@ -4,12 +4,19 @@ import re
 import sys
 
 import gdb
-import gdb.printing
 
 if sys.version_info[0] < 3:
     raise gdb.GdbError(
         "MongoDB gdb extensions only support Python 3. Your GDB was compiled against Python 2")
 
+MUTEX_LOCK_NAME = 'std::mutex::lock'
+MUTEX_LOCK_RE = re.compile(r'std::mutex::lock\(\)')
+# In versions of MongoDB 4.0 and older, the LockerImpl class is templatized with a boolean
+# parameter. With the removal of the MMAPv1 storage engine in MongoDB 4.2, the LockerImpl class
+# is no longer templatized.
+LOCKER_IMPL_NAME = 'mongo::LockerImpl'
+LOCKER_IMPL_RE = re.compile(r'mongo::LockerImpl(?:\<.*\>)?::')
+
 
 class NonExecutingThread(object):
     """NonExecutingThread class.
@@ -23,6 +30,7 @@ class NonExecutingThread(object):
     def __init__(self, locker_id):
         """Initialize Thread."""
         self.locker_id = locker_id
+        self._key = "LockerId {}".format(locker_id)
 
     def __eq__(self, other):
         if isinstance(other, NonExecutingThread):
@@ -37,7 +45,7 @@ class NonExecutingThread(object):
 
     def key(self):
         """Return NonExecutingThread key."""
-        return "LockerId {}".format(self.locker_id)
+        return self._key
 
 
 class Thread(object):
@@ -48,6 +56,7 @@ class Thread(object):
         self.thread_id = thread_id
         self.lwpid = lwpid
         self.name = thread_name
+        self._key = "Thread 0x{:012x}".format(thread_id)
 
     def __eq__(self, other):
         if isinstance(other, Thread):
@@ -62,7 +71,7 @@ class Thread(object):
 
     def key(self):
         """Return thread key."""
-        return "Thread 0x{:012x}".format(self.thread_id)
+        return self._key
 
 
 class Lock(object):
@@ -72,6 +81,7 @@ class Lock(object):
         """Initialize Lock."""
         self.addr = addr
         self.resource = resource
+        self._key = "Lock 0x{:012x}".format(addr)
 
     def __eq__(self, other):
         if isinstance(other, Lock):
@@ -86,26 +96,38 @@ class Lock(object):
 
     def key(self):
         """Return lock key."""
-        return "Lock 0x{:012x}".format(self.addr)
+        return self._key
 
 
 class Graph(object):
     """Graph class.
 
-    The Graph is a dict with the following structure:
-      {'node_key': {'node': {id: val}, 'next_nodes': [node_key_1, ...]}}
+    The Graph is kept as two dicts sharing the same node keys:
+      nodes: {'node_key': {id: val}}
+      next_nodes: {'node_key': {node_key_1: None, ...}}
+    The next_nodes of each node are kept as the keys of a dict, which acts as an insertion ordered
+    set.
     Example graph:
+      nodes:
+      {
+       'Lock 1': {1: 'MongoDB lock'},
+       'Lock 2': {2: 'MongoDB lock'},
+       'Thread 1': {1: 123},
+       'Thread 2': {2: 456}
+      }
+      next_nodes:
       {
-       'Lock 1': {'node': {1: 'MongoDB lock'}, 'next_nodes': ['Thread 1']},
-       'Lock 2': {'node': {2: 'MongoDB lock'}, 'next_nodes': ['Thread 2']},
-       'Thread 1': {'node': {1: 123}, 'next_nodes': ['Lock 2']},
-       'Thread 2': {'node': {2: 456}, 'next_nodes': ['Lock 1']}
+       'Lock 1': {'Thread 1': None},
+       'Lock 2': {'Thread 2': None},
+       'Thread 1': {'Lock 2': None},
+       'Thread 2': {'Lock 1': None}
       }
     """
 
     def __init__(self):
         """Initialize Graph."""
         self.nodes = {}
+        self.next_nodes = {}
 
     def is_empty(self):
         """Return True if graph is empty."""
@@ -113,64 +135,60 @@ class Graph(object):
 
     def add_node(self, node):
         """Add node to graph."""
-        if not self.find_node(node):
-            self.nodes[node.key()] = {'node': node, 'next_nodes': []}
+        node_key = node.key()
+        if node_key not in self.nodes:
+            self.nodes[node_key] = node
+            self.next_nodes[node_key] = {}
 
     def find_node(self, node):
         """Find node in graph."""
-        if node.key() in self.nodes:
-            return self.nodes[node.key()]
-        return None
-
-    def find_from_node(self, from_node):
-        """Find from node."""
-        for node_key in self.nodes:
-            node = self.nodes[node_key]
-            for next_node in node['next_nodes']:
-                if next_node == from_node['node'].key():
-                    return node
-        return None
+        return self.nodes.get(node.key())
 
     def remove_nodes_without_edge(self):
         """Remove nodes without edge."""
         # Rebuild graph by removing any nodes which do not have any incoming or outgoing edges.
-        temp_nodes = {}
-        for node_key in self.nodes:
-            node = self.nodes[node_key]
-            if node['next_nodes'] or self.find_from_node(node) is not None:
-                temp_nodes[node_key] = self.nodes[node_key]
-        self.nodes = temp_nodes
+        nodes_with_edge = set()
+        for node_key, next_nodes in self.next_nodes.items():
+            if next_nodes:
+                nodes_with_edge.add(node_key)
+                nodes_with_edge.update(next_nodes)
+        self.nodes = {
+            node_key: node
+            for node_key, node in self.nodes.items() if node_key in nodes_with_edge
+        }
+        self.next_nodes = {
+            node_key: next_nodes
+            for node_key, next_nodes in self.next_nodes.items() if node_key in nodes_with_edge
+        }
 
     def add_edge(self, from_node, to_node):
         """Add edge."""
-        f_node = self.find_node(from_node)
-        if f_node is None:
-            self.add_node(from_node)
-            f_node = self.nodes[from_node.key()]
-
-        t_node = self.find_node(to_node)
-        if t_node is None:
-            self.add_node(to_node)
-            t_node = self.nodes[to_node.key()]
-
-        for n_node in f_node['next_nodes']:
-            if n_node == to_node.key():
-                return
-        self.nodes[from_node.key()]['next_nodes'].append(to_node.key())
+        from_key = from_node.key()
+        f_next_nodes = self.next_nodes.get(from_key)
+        if f_next_nodes is None:
+            self.nodes[from_key] = from_node
+            f_next_nodes = self.next_nodes[from_key] = {}
+
+        to_key = to_node.key()
+        if to_key not in self.nodes:
+            self.nodes[to_key] = to_node
+            self.next_nodes[to_key] = {}
+
+        f_next_nodes[to_key] = None
 
     def print(self):
         """Print graph."""
-        for node_key in self.nodes:
-            print("Node", self.nodes[node_key]['node'])
-            for to_node in self.nodes[node_key]['next_nodes']:
-                print(" ->", self.nodes[to_node]['node'])
+        for node_key, node in self.nodes.items():
+            print("Node", node)
+            for to_node in self.next_nodes[node_key]:
+                print(" ->", self.nodes[to_node])
 
-    def _get_node_escaped(self, node_key):
-        """Return the name of the node with any double quotes escaped.
+    def _get_nodes_escaped(self):
+        """Return a dict of the name of each node with any double quotes escaped.
 
         The DOT language requires that literal double quotes be escaped using a backslash character.
         """
-        return str(self.nodes[node_key]['node']).replace('"', '\\"')
+        return {node_key: str(node).replace('"', '\\"') for node_key, node in self.nodes.items()}
 
     def to_graph(self, nodes=None, message=None):
         """Return the 'to_graph'."""
@@ -187,61 +205,114 @@ class Graph(object):
         # resource, but only a few resources involved in a deadlock, so we prefer a long graph
         # than a super wide one. Long resource / thread names would make a wide graph even wider.
         sb.append('    rankdir=LR;')
-        for node_key in self.nodes:
-            for next_node_key in self.nodes[node_key]['next_nodes']:
-                sb.append('    "{}" -> "{}";'.format(
-                    self._get_node_escaped(node_key), self._get_node_escaped(next_node_key)))
-        for node_key in self.nodes:
+        # Each node name is used by every edge it is part of, so only escape it once.
+        nodes_escaped = self._get_nodes_escaped()
+        for node_key, next_nodes in self.next_nodes.items():
+            node_escaped = nodes_escaped[node_key]
+            sb.extend('    "{}" -> "{}";'.format(node_escaped, nodes_escaped[next_node_key])
+                      for next_node_key in next_nodes)
+        for node_key, node_escaped in nodes_escaped.items():
             color = ""
             if nodes and node_key in nodes:
                 color = "color = red"
 
-            sb.append('    "{0}" [label="{0}" {1}]'.format(self._get_node_escaped(node_key), color))
+            sb.append('    "{0}" [label="{0}" {1}]'.format(node_escaped, color))
         sb.append("}")
         return "\n".join(sb)
 
-    def depth_first_search(self, node_key, nodes_visited, nodes_in_cycle=None):
+    def depth_first_search(self, node_key, nodes_visited):
         """Perform depth first search and return the list of nodes in the cycle or None.
 
         The nodes_visited is a set of nodes which indicates it has been visited.
-        The node_in_cycle is a list of nodes in the potential cycle.
+        The search uses an explicit stack, so deep graphs cannot exceed the recursion limit.
         """
-        if nodes_in_cycle is None:
-            nodes_in_cycle = []
+        # The nodes in the potential cycle, and the position of each one in that path.
+        nodes_in_cycle = [node_key]
+        path_index = {node_key: 0}
+        stack = [iter(self.next_nodes[node_key])]
         nodes_visited.add(node_key)
-        nodes_in_cycle.append(node_key)
-        for node in self.nodes[node_key]['next_nodes']:
-            if node in nodes_in_cycle:
-                # The graph cycle starts at the index of node in nodes_in_cycle.
-                return nodes_in_cycle[nodes_in_cycle.index(node):]
-            if node not in nodes_visited:
-                dfs_nodes = self.depth_first_search(node, nodes_visited, nodes_in_cycle)
-                if dfs_nodes:
-                    return dfs_nodes
-
-        # This node_key is not part of the graph cycle.
-        nodes_in_cycle.pop()
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                # The node at the end of the path is not part of the graph cycle.
+                del path_index[nodes_in_cycle.pop()]
+                stack.pop()
+            elif node in path_index:
+                # The graph cycle starts at the position of node in nodes_in_cycle.
+                return nodes_in_cycle[path_index[node]:]
+            elif node not in nodes_visited:
+                nodes_visited.add(node)
+                path_index[node] = len(nodes_in_cycle)
+                nodes_in_cycle.append(node)
+                stack.append(iter(self.next_nodes[node]))
+
         return None
 
+    def strongly_connected_components(self):
+        """Return the strongly connected components of the graph as lists of node keys.
+
+        This is an iterative version of Tarjan's algorithm, so it finds every component in a single
+        pass over the graph.
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for root in self.nodes:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.next_nodes[root]))]
+            while work:
+                node_key, next_nodes = work[-1]
+                for next_node in next_nodes:
+                    if next_node not in index:
+                        index[next_node] = lowlink[next_node] = len(index)
+                        stack.append(next_node)
+                        on_stack.add(next_node)
+                        work.append((next_node, iter(self.next_nodes[next_node])))
+                        break
+                    if next_node in on_stack:
+                        lowlink[node_key] = min(lowlink[node_key], index[next_node])
+                else:
+                    work.pop()
+                    if work:
+                        parent_key = work[-1][0]
+                        lowlink[parent_key] = min(lowlink[parent_key], lowlink[node_key])
+                    if lowlink[node_key] == index[node_key]:
+                        component = []
+                        member = None
+                        while member != node_key:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                        components.append(component)
+        return components
+
+    def find_nodes_in_cycles(self):
+        """Return the set of keys of all nodes which are part of any cycle."""
+        return {
+            node_key
+            for component in self.strongly_connected_components()
+            if len(component) > 1 or component[0] in self.next_nodes[component[0]]
+            for node_key in component
+        }
+
     def detect_cycle(self):
         """If a cycle is detected, returns a list of nodes in the cycle or None."""
         nodes_visited = set()
-        for node in self.nodes:
-            if node not in nodes_visited:
+        for node, next_nodes in self.next_nodes.items():
+            # A node without outgoing edges can never be part of a cycle.
+            if next_nodes and node not in nodes_visited:
                 cycle_path = self.depth_first_search(node, nodes_visited)
                 if cycle_path:
-                    return [str(self.nodes[node_key]['node']) for node_key in cycle_path]
+                    return [str(self.nodes[node_key]) for node_key in cycle_path]
         return None
 
 
-def find_thread(thread_dict, search_thread_id):
-    """Find thread."""
-    for (_, thread) in list(thread_dict.items()):
-        if thread.thread_id == search_thread_id:
-            return thread
-    return None
-
-
 def find_func_block(block):
     """Find func block."""
     while block:
@@ -251,20 +322,26 @@ def find_func_block(block):
     return None
 
 
-def find_frame(function_name_pattern):
-    """Find frame."""
+def find_frame(function_name_pattern, function_name_part):
+    """Find the newest frame whose function name matches the compiled function_name_pattern.
+
+    Frames whose name does not contain function_name_part are skipped without looking up their
+    blocks, which is much cheaper than resolving the function of every frame.
+    """
     frame = gdb.newest_frame()
     while frame:
-        block = None
-        try:
-            block = frame.block()
-        except RuntimeError as err:
-            if err.args[0] != "Cannot locate block for frame.":
-                raise
-
-        block = find_func_block(block)
-        if block and re.match(function_name_pattern, block.function.name):
-            return frame
+        frame_name = frame.name()
+        if frame_name is None or function_name_part in frame_name:
+            block = None
+            try:
+                block = frame.block()
+            except RuntimeError as err:
+                if err.args[0] != "Cannot locate block for frame.":
+                    raise
+
+            block = find_func_block(block)
+            if block and function_name_pattern.match(block.function.name):
+                return frame
         try:
             frame = frame.older()
         except gdb.error as err:
@@ -275,7 +352,7 @@ def find_frame(function_name_pattern):
 
 def find_mutex_holder(graph, thread_dict, show):
     """Find mutex holder."""
-    frame = find_frame(r'std::mutex::lock\(\)')
+    frame = find_frame(MUTEX_LOCK_RE, MUTEX_LOCK_NAME)
     if frame is None:
         return
 
@@ -303,37 +380,36 @@ def find_mutex_holder(graph, thread_dict, show):
         print("Mutex at {} held by {} waited on by {}".format(mutex_value, mutex_holder,
                                                               mutex_waiter))
     if graph:
-        graph.add_edge(mutex_waiter, Lock(int(mutex_value), "Mutex"))
-        graph.add_edge(Lock(int(mutex_value), "Mutex"), mutex_holder)
-
-
-def find_lock_manager_holders(graph, thread_dict, show):  # pylint: disable=too-many-locals
-    """Find lock manager holders."""
-    # In versions of MongoDB 4.0 and older, the LockerImpl class is templatized with a boolean
-    # parameter. With the removal of the MMAPv1 storage engine in MongoDB 4.2, the LockerImpl class
-    # is no longer templatized.
-    frame = find_frame(r'mongo::LockerImpl(?:\<.*\>)?::')
-    if not frame:
-        return
+        mutex_lock = Lock(int(mutex_value), "Mutex")
+        graph.add_edge(mutex_waiter, mutex_lock)
+        graph.add_edge(mutex_lock, mutex_holder)
 
-    frame.select()
-
-    (_, lock_waiter_lwpid, _) = gdb.selected_thread().ptid
-    lock_waiter = thread_dict[lock_waiter_lwpid]
 
+def get_locker_ptr_type():
+    """Get the pointer type of the LockerImpl class."""
     try:
-        locker_ptr_type = gdb.lookup_type("mongo::LockerImpl<false>").pointer()
+        return gdb.lookup_type("mongo::LockerImpl<false>").pointer()
     except gdb.error as err:
         # If we don't find the templatized version of the LockerImpl class, then we try to find the
         # non-templatized version.
         if not err.args[0].startswith("No type named"):
             raise
 
-        locker_ptr_type = gdb.lookup_type("mongo::LockerImpl").pointer()
+        return gdb.lookup_type("mongo::LockerImpl").pointer()
+
+
+def find_lock_manager_holders(graph, thread_dict, thread_by_id, frame, locker_ptr_type, show):
+    """Find lock manager holders of the lock being waited on in the given LockerImpl frame."""
+    # pylint: disable=too-many-arguments,too-many-locals
+    frame.select()
+
+    (_, lock_waiter_lwpid, _) = gdb.selected_thread().ptid
+    lock_waiter = thread_dict[lock_waiter_lwpid]
 
     lock_head = gdb.parse_and_eval(
         "mongo::getGlobalLockManager()->_getBucket(resId)->findOrInsert(resId)")
 
+    lock_head_addr = int(lock_head)
     granted_list = lock_head.dereference()["grantedList"]
     lock_request_ptr = granted_list["_front"]
     while lock_request_ptr:
@@ -346,32 +422,49 @@ def find_lock_manager_holders(graph, thread_dict, show):  # pylint: disable=too-
             locker_id = int(locker["_id"])
             lock_holder = NonExecutingThread(locker_id)
         else:
-            lock_holder = find_thread(thread_dict, lock_holder_id)
+            lock_holder = thread_by_id.get(lock_holder_id)
+        lock_mode = lock_request["mode"]
         if show:
             print("MongoDB Lock at {} held by {} ({}) waited on by {}".format(
-                lock_head, lock_holder, lock_request["mode"], lock_waiter))
+                lock_head, lock_holder, lock_mode, lock_waiter))
         if graph:
-            graph.add_edge(lock_waiter, Lock(int(lock_head), lock_request["mode"]))
-            graph.add_edge(Lock(int(lock_head), lock_request["mode"]), lock_holder)
+            # The lock is shared by every request, but each request is granted its own mode.
+            mdb_lock = Lock(lock_head_addr, lock_mode)
+            graph.add_edge(lock_waiter, mdb_lock)
+            graph.add_edge(mdb_lock, lock_holder)
         lock_request_ptr = lock_request["next"]
 
 
-def get_locks(graph, thread_dict, show=False):
-    """Get locks."""
-    for thread in gdb.selected_inferior().threads():
+def get_locks(graph, thread_dict, thread_by_id, waiting_threads, show=False):
+    """Get the locks that the given waiting threads are waiting on."""
+    # pylint: disable=too-many-arguments
+    # The LockerImpl type is only looked up once a thread waiting on a MongoDB lock is found.
+    locker_ptr_type = None
+    for thread in waiting_threads:
         try:
             if not thread.is_valid():
                 continue
             thread.switch()
             find_mutex_holder(graph, thread_dict, show)
-            find_lock_manager_holders(graph, thread_dict, show)
+            frame = find_frame(LOCKER_IMPL_RE, LOCKER_IMPL_NAME)
+            if frame:
+                if locker_ptr_type is None:
+                    locker_ptr_type = get_locker_ptr_type()
+                find_lock_manager_holders(graph, thread_dict, thread_by_id, frame, locker_ptr_type,
+                                          show)
         except gdb.error as err:
             print("Ignoring GDB error '%s' in get_locks" % str(err))
 
 
 def get_threads_info():
-    """Get threads info."""
+    """Get threads info.
+
+    Return a tuple of dicts holding the same Thread objects, keyed by LWPID and by thread id, and
+    the list of GDB threads that are waiting on a mutex or a MongoDB lock.
+    """
     thread_dict = {}
+    thread_by_id = {}
+    waiting_threads = []
     for thread in gdb.selected_inferior().threads():
         try:
             if not thread.is_valid():
@@ -385,11 +478,16 @@ def get_threads_info():
             if not thread_id:
                 print("Unable to retrieve thread_info for thread %d" % thread_num)
                 continue
-            thread_dict[lwpid] = Thread(thread_id, lwpid, thread_name)
+            thread_dict[lwpid] = thread_by_id[thread_id] = Thread(thread_id, lwpid, thread_name)
+            # Check for waiting frames while this thread is selected, so get_locks only needs to
+            # switch to the threads that are waiting.
+            if find_frame(MUTEX_LOCK_RE, MUTEX_LOCK_NAME) or find_frame(
+                    LOCKER_IMPL_RE, LOCKER_IMPL_NAME):
+                waiting_threads.append(thread)
         except gdb.error as err:
             print("Ignoring GDB error '%s' in get_threads_info" % str(err))
 
-    return thread_dict
+    return thread_dict, thread_by_id, waiting_threads
 
 
 class MongoDBShowLocks(gdb.Command):
@@ -408,8 +506,9 @@ class MongoDBShowLocks(gdb.Command):
     def mongodb_show_locks():
         """GDB in-process python supplement."""
         try:
-            thread_dict = get_threads_info()
-            get_locks(graph=None, thread_dict=thread_dict, show=True)
+            thread_dict, thread_by_id, waiting_threads = get_threads_info()
+            get_locks(graph=None, thread_dict=thread_dict, thread_by_id=thread_by_id,
+                      waiting_threads=waiting_threads, show=True)
         except gdb.error as err:
             print("Ignoring GDB error '%s' in mongodb_show_locks" % str(err))
 
@@ -435,23 +534,27 @@ class MongoDBWaitsForGraph(gdb.Command):
 
         graph = Graph()
         try:
-            thread_dict = get_threads_info()
-            get_locks(graph=graph, thread_dict=thread_dict, show=False)
+            thread_dict, thread_by_id, waiting_threads = get_threads_info()
+            get_locks(graph=graph, thread_dict=thread_dict, thread_by_id=thread_by_id,
+                      waiting_threads=waiting_threads, show=False)
             graph.remove_nodes_without_edge()
             if graph.is_empty():
                 print("Not generating the digraph, since the lock graph is empty")
                 return
             cycle_message = "# No cycle detected in the graph"
             cycle_nodes = graph.detect_cycle()
+            # Highlight every node that is part of a cycle, not just the nodes of the first one.
+            nodes_in_cycles = None
             if cycle_nodes:
                 cycle_message = "# Cycle detected in the graph nodes %s" % cycle_nodes
+                nodes_in_cycles = graph.find_nodes_in_cycles()
             if graph_file:
                 print("Saving digraph to %s" % graph_file)
                 with open(graph_file, 'w') as fh:
-                    fh.write(graph.to_graph(nodes=cycle_nodes, message=cycle_message))
+                    fh.write(graph.to_graph(nodes=nodes_in_cycles, message=cycle_message))
                 print(cycle_message.split("# ")[1])
             else:
-                print(graph.to_graph(nodes=cycle_nodes, message=cycle_message))
+                print(graph.to_graph(nodes=nodes_in_cycles, message=cycle_message))
 
         except gdb.error as err:
             print("Ignoring GDB error '%s' in mongod_deadlock_graph" % str(err))
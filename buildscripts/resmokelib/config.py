@@ -320,13 +320,13 @@ MONGO_EXECUTABLE = None
 # The path to the mongod executable used by resmoke.py.
 MONGOD_EXECUTABLE = None
 
-# The --setParameter options passed to mongod.
+# The --setParameter options passed to mongod, as a dict parsed from --mongodSetParameters.
 MONGOD_SET_PARAMETERS = None
 
 # The path to the mongos executable used by resmoke.py.
 MONGOS_EXECUTABLE = None
 
-# The --setParameter options passed to mongos.
+# The --setParameter options passed to mongos, as a dict parsed from --mongosSetParameters.
 MONGOS_SET_PARAMETERS = None
 
 # If true, then all mongod's started by resmoke.py and by the mongo shell will not have journaling
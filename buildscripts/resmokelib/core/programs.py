@@ -118,7 +118,7 @@ def mongod_program(  # pylint: disable=too-many-branches,too-many-statements
     suite_set_parameters = kwargs.pop("set_parameters", {})
 
     if config.MONGOD_SET_PARAMETERS is not None:
-        suite_set_parameters.update(utils.load_yaml(config.MONGOD_SET_PARAMETERS))
+        suite_set_parameters.update(config.MONGOD_SET_PARAMETERS)
 
     # Set default log verbosity levels if none were specified.
     if "logComponentVerbosity" not in suite_set_parameters:
@@ -253,7 +253,7 @@ def mongos_program(logger, executable=None, process_kwargs=None, **kwargs):
     suite_set_parameters = kwargs.pop("set_parameters", {})
 
     if config.MONGOS_SET_PARAMETERS is not None:
-        suite_set_parameters.update(utils.load_yaml(config.MONGOS_SET_PARAMETERS))
+        suite_set_parameters.update(config.MONGOS_SET_PARAMETERS)
 
     # Set default log verbosity levels if none were specified.
     if "logComponentVerbosity" not in suite_set_parameters:
@@ -326,12 +326,12 @@ def mongo_shell_program(  # pylint: disable=too-many-branches,too-many-locals,to
     # Propagate additional setParameters to mongod processes spawned by the mongo shell. Command
     # line options to resmoke.py override the YAML configuration.
     if config.MONGOD_SET_PARAMETERS is not None:
-        mongod_set_parameters.update(utils.load_yaml(config.MONGOD_SET_PARAMETERS))
+        mongod_set_parameters.update(config.MONGOD_SET_PARAMETERS)
 
     # Propagate additional setParameters to mongos processes spawned by the mongo shell. Command
     # line options to resmoke.py override the YAML configuration.
     if config.MONGOS_SET_PARAMETERS is not None:
-        mongos_set_parameters.update(utils.load_yaml(config.MONGOS_SET_PARAMETERS))
+        mongos_set_parameters.update(config.MONGOS_SET_PARAMETERS)
 
     # If the 'logComponentVerbosity' setParameter for mongod was not already specified, we set its
     # value to a default.
@@ -20,6 +20,48 @@ ResmokeConfig = collections.namedtuple(
 
 _EVERGREEN_OPTIONS_TITLE = "Evergreen options"
 
+# The choices shared by several options, defined once rather than for each option.
+_ON_OFF_CHOICES = ("on", "off")
+_ON_OFF_AUTO_CHOICES = ("on", "off", "auto")
+_SHELL_MODE_CHOICES = ("commands", "compatibility", "legacy")
+
+# The metavar and help shared by the --mongodSetParameters and --mongosSetParameters options.
+_SET_PARAMETERS_METAVAR = "{key1: value1, key2: value2, ..., keyN: valueN}"
+_SET_PARAMETERS_HELP = ("Passes one or more --setParameter options to all {} processes"
+                        " started by resmoke.py. The argument is specified as bracketed YAML -"
+                        " i.e. JSON with support for single quoted and unquoted keys.")
+
+_EXCLUDE_WITH_ANY_TAGS_HELP = ("Comma separated list of tags. Any jstest that contains any of the"
+                               " specified tags will be excluded from any suites that are run."
+                               " The tag '{}' is implicitly part of this list.").format(
+                                   _config.EXCLUDED_TAG)
+
+_BENCHMARK_MIN_TIME_HELP = (
+    "Minimum time to run each benchmark/benchrun test for. Use this option instead of "
+    "--benchmarkRepetitions to make a test run for a longer or shorter duration.")
+
+_BENCHMARK_REPETITIONS_HELP = (
+    "Set --benchmarkRepetitions=1 if you'd like to run the benchmark/benchrun tests only once."
+    " By default, each test is run multiple times to provide statistics on the variance"
+    " between runs; use --benchmarkMinTimeSecs if you'd like to run a test for a longer or"
+    " shorter duration.")
+
+# The options that to_local_args() leaves out, in addition to the Evergreen options.
+_LOCAL_ARGS_OPTIONS_TO_IGNORE = frozenset([
+    "--archiveLimitMb",
+    "--archiveLimitTests",
+    "--buildloggerUrl",
+    "--log",
+    "--perfReportFile",
+    "--reportFailureStatus",
+    "--reportFile",
+    "--staggerJobs",
+    "--tagFile",
+])
+
+# The parser is created on first use and then reused, since its options never change.
+_PARSER = None
+
 
 def _make_parser():  # pylint: disable=too-many-statements
     """Create and return the command line arguments parser."""
@@ -83,11 +125,8 @@ def _make_parser():  # pylint: disable=too-many-statements
     parser.add_option("--dbtest", dest="dbtest_executable", metavar="PATH",
                       help="The path to the dbtest executable for resmoke to use.")
 
-    parser.add_option(
-        "--excludeWithAnyTags", action="append", dest="exclude_with_any_tags", metavar="TAG1,TAG2",
-        help=("Comma separated list of tags. Any jstest that contains any of the"
-              " specified tags will be excluded from any suites that are run."
-              " The tag '{}' is implicitly part of this list.".format(_config.EXCLUDED_TAG)))
+    parser.add_option("--excludeWithAnyTags", action="append", dest="exclude_with_any_tags",
+                      metavar="TAG1,TAG2", help=_EXCLUDE_WITH_ANY_TAGS_HELP)
 
     parser.add_option("-f", "--findSuites", action="store_true", dest="find_suites",
                       help="Lists the names of the suites that will execute the specified tests.")
@@ -133,22 +172,14 @@ def _make_parser():  # pylint: disable=too-many-statements
     parser.add_option("--mongod", dest="mongod_executable", metavar="PATH",
                       help="The path to the mongod executable for resmoke.py to use.")
 
-    parser.add_option(
-        "--mongodSetParameters", dest="mongod_set_parameters",
-        metavar="{key1: value1, key2: value2, ..., keyN: valueN}",
-        help=("Passes one or more --setParameter options to all mongod processes"
-              " started by resmoke.py. The argument is specified as bracketed YAML -"
-              " i.e. JSON with support for single quoted and unquoted keys."))
+    parser.add_option("--mongodSetParameters", dest="mongod_set_parameters",
+                      metavar=_SET_PARAMETERS_METAVAR, help=_SET_PARAMETERS_HELP.format("mongod"))
 
     parser.add_option("--mongos", dest="mongos_executable", metavar="PATH",
                       help="The path to the mongos executable for resmoke.py to use.")
 
-    parser.add_option(
-        "--mongosSetParameters", dest="mongos_set_parameters",
-        metavar="{key1: value1, key2: value2, ..., keyN: valueN}",
-        help=("Passes one or more --setParameter options to all mongos processes"
-              " started by resmoke.py. The argument is specified as bracketed YAML -"
-              " i.e. JSON with support for single quoted and unquoted keys."))
+    parser.add_option("--mongosSetParameters", dest="mongos_set_parameters",
+                      metavar=_SET_PARAMETERS_METAVAR, help=_SET_PARAMETERS_HELP.format("mongos"))
 
     parser.add_option("--nojournal", action="store_true", dest="no_journal",
                       help="Disables journaling for all mongod's.")
@@ -222,11 +253,11 @@ def _make_parser():  # pylint: disable=too-many-statements
                       help="The transport layer used by jstests")
 
     parser.add_option("--shellReadMode", type="choice", action="store", dest="shell_read_mode",
-                      choices=("commands", "compatibility", "legacy"), metavar="READ_MODE",
+                      choices=_SHELL_MODE_CHOICES, metavar="READ_MODE",
                       help="The read mode used by the mongo shell.")
 
     parser.add_option("--shellWriteMode", type="choice", action="store", dest="shell_write_mode",
-                      choices=("commands", "compatibility", "legacy"), metavar="WRITE_MODE",
+                      choices=_SHELL_MODE_CHOICES, metavar="WRITE_MODE",
                       help="The write mode used by the mongo shell.")
 
     parser.add_option(
@@ -236,25 +267,26 @@ def _make_parser():  # pylint: disable=too-many-statements
 
     parser.add_option(
         "--shuffleMode", type="choice", action="store", dest="shuffle",
-        choices=("on", "off", "auto"), metavar="ON|OFF|AUTO",
+        choices=_ON_OFF_AUTO_CHOICES, metavar="ON|OFF|AUTO",
         help=("Controls whether to randomize the order in which tests are executed."
               " Defaults to auto when not supplied. auto enables randomization in"
               " all cases except when the number of jobs requested is 1."))
 
     parser.add_option(
-        "--staggerJobs", type="choice", action="store", dest="stagger_jobs", choices=("on", "off"),
-        metavar="ON|OFF", help=("Enables or disables the stagger of launching resmoke jobs."
-                                " Defaults to %default."))
+        "--staggerJobs", type="choice", action="store", dest="stagger_jobs",
+        choices=_ON_OFF_CHOICES, metavar="ON|OFF",
+        help=("Enables or disables the stagger of launching resmoke jobs."
+              " Defaults to %default."))
 
     parser.add_option(
         "--majorityReadConcern", type="choice", action="store", dest="majority_read_concern",
-        choices=("on",
-                 "off"), metavar="ON|OFF", help=("Enable or disable majority read concern support."
-                                                 " Defaults to %default."))
+        choices=_ON_OFF_CHOICES, metavar="ON|OFF",
+        help=("Enable or disable majority read concern support."
+              " Defaults to %default."))
 
     parser.add_option("--flowControl", type="choice", action="store", dest="flow_control",
-                      choices=("on",
-                               "off"), metavar="ON|OFF", help=("Enable or disable flow control."))
+                      choices=_ON_OFF_CHOICES, metavar="ON|OFF",
+                      help=("Enable or disable flow control."))
 
     parser.add_option("--flowControlTicketOverride", type="int", action="store",
                       dest="flow_control_tickets", metavar="TICKET_OVERRIDE",
@@ -302,8 +334,9 @@ def _make_parser():  # pylint: disable=too-many-statements
         " with two shards and two replica set nodes each, specify 'old-new-old-new'.")
 
     parser.add_option(
-        "--linearChain", type="choice", action="store", dest="linear_chain", choices=("on", "off"),
-        metavar="ON|OFF", help="Enable or disable linear chaining for tests using "
+        "--linearChain", type="choice", action="store", dest="linear_chain",
+        choices=_ON_OFF_CHOICES, metavar="ON|OFF",
+        help="Enable or disable linear chaining for tests using "
         "ReplicaSetFixture.")
 
     evergreen_options = optparse.OptionGroup(
@@ -380,20 +413,12 @@ def _make_parser():  # pylint: disable=too-many-statements
         help=("Lists all Google benchmark test configurations in each"
               " test file."))
 
-    benchmark_min_time_help = (
-        "Minimum time to run each benchmark/benchrun test for. Use this option instead of "
-        "--benchmarkRepetitions to make a test run for a longer or shorter duration.")
     benchmark_options.add_option("--benchmarkMinTimeSecs", type="int",
                                  dest="benchmark_min_time_secs", metavar="BENCHMARK_MIN_TIME",
-                                 help=benchmark_min_time_help)
+                                 help=_BENCHMARK_MIN_TIME_HELP)
 
-    benchmark_repetitions_help = (
-        "Set --benchmarkRepetitions=1 if you'd like to run the benchmark/benchrun tests only once."
-        " By default, each test is run multiple times to provide statistics on the variance"
-        " between runs; use --benchmarkMinTimeSecs if you'd like to run a test for a longer or"
-        " shorter duration.")
     benchmark_options.add_option("--benchmarkRepetitions", type="int", dest="benchmark_repetitions",
-                                 metavar="BENCHMARK_REPETITIONS", help=benchmark_repetitions_help)
+                                 metavar="BENCHMARK_REPETITIONS", help=_BENCHMARK_REPETITIONS_HELP)
 
     parser.set_defaults(dry_run="off", find_suites=False, list_suites=False, logger_file="console",
                         shuffle="auto", stagger_jobs="off", suite_files="with_server",
@@ -402,6 +427,15 @@ def _make_parser():  # pylint: disable=too-many-statements
     return parser
 
 
+def _get_parser():
+    """Return the command line arguments parser, creating it if it doesn't exist yet."""
+
+    global _PARSER  # pylint: disable=global-statement
+    if _PARSER is None:
+        _PARSER = _make_parser()
+    return _PARSER
+
+
 def to_local_args(args=None):  # pylint: disable=too-many-branches,too-many-locals
     """
     Return a command line invocation for resmoke.py suitable for being run outside of Evergreen.
@@ -413,7 +447,7 @@ def to_local_args(args=None):  # pylint: disable=too-many-branches,too-many-loca
     if args is None:
         args = sys.argv[1:]
 
-    parser = _make_parser()
+    parser = _get_parser()
 
     # We call optparse.OptionParser.parse_args() with a new instance of optparse.Values to avoid
     # having the default values filled in. This makes it so 'options' only contains command line
@@ -432,26 +466,19 @@ def to_local_args(args=None):  # pylint: disable=too-many-branches,too-many-loca
     # _get_all_options() method to ever be removed or renamed.
     all_options = parser._get_all_options()  # pylint: disable=protected-access
 
-    options_by_dest = {}
-    for option in all_options:
-        options_by_dest[option.dest] = option
+    options_by_dest = {option.dest: option for option in all_options}
+
+    # Look up the Evergreen options once rather than searching the option groups for each option.
+    evergreen_option_names = {
+        option.get_opt_string()
+        for option_group in parser.option_groups if option_group.title == _EVERGREEN_OPTIONS_TITLE
+        for option in option_group.option_list
+    }
 
     suites_arg = None
     storage_engine_arg = None
     other_local_args = []
 
-    options_to_ignore = {
-        "--archiveLimitMb",
-        "--archiveLimitTests",
-        "--buildloggerUrl",
-        "--log",
-        "--perfReportFile",
-        "--reportFailureStatus",
-        "--reportFile",
-        "--staggerJobs",
-        "--tagFile",
-    }
-
     def format_option(option_name, option_value):
         """
         Return <option_name>=<option_value>.
@@ -465,11 +492,7 @@ def to_local_args(args=None):  # pylint: disable=too-many-branches,too-many-loca
         option = options_by_dest[option_dest]
         option_name = option.get_opt_string()
 
-        if option_name in options_to_ignore:
-            continue
-
-        option_group = parser.get_option_group(option_name)
-        if option_group is not None and option_group.title == _EVERGREEN_OPTIONS_TITLE:
+        if option_name in _LOCAL_ARGS_OPTIONS_TO_IGNORE or option_name in evergreen_option_names:
             continue
 
         if option.takes_value():
@@ -496,7 +519,7 @@ def to_local_args(args=None):  # pylint: disable=too-many-branches,too-many-loca
 
 def parse_command_line():
     """Parse the command line arguments passed to resmoke.py."""
-    parser = _make_parser()
+    parser = _get_parser()
     options, args = parser.parse_args()
 
     _validate_options(parser, options, args)
@@ -629,10 +652,10 @@ def _update_config_vars(values):  # pylint: disable=too-many-statements,too-many
     _config.DBTEST_EXECUTABLE = _expand_user(config.pop("dbtest_executable"))
     _config.MONGO_EXECUTABLE = _expand_user(config.pop("mongo_executable"))
     _config.MONGOD_EXECUTABLE = _expand_user(config.pop("mongod_executable"))
-    _config.MONGOD_SET_PARAMETERS = config.pop("mongod_set_parameters")
+    _config.MONGOD_SET_PARAMETERS = _load_yaml(config.pop("mongod_set_parameters"))
     _config.MONGOS_EXECUTABLE = _expand_user(config.pop("mongos_executable"))
 
-    _config.MONGOS_SET_PARAMETERS = config.pop("mongos_set_parameters")
+    _config.MONGOS_SET_PARAMETERS = _load_yaml(config.pop("mongos_set_parameters"))
     _config.NO_JOURNAL = config.pop("no_journal")
     _config.NUM_CLIENTS_PER_FIXTURE = config.pop("num_clients_per_fixture")
     _config.NUM_REPLSET_NODES = config.pop("num_replset_nodes")
@@ -768,6 +791,13 @@ def _expand_user(pathname):
     return os.path.expanduser(pathname)
 
 
+def _load_yaml(value):
+    """Provide wrapper around utils.load_yaml() to do nothing when given None."""
+    if value is None:
+        return None
+    return utils.load_yaml(value)
+
+
 def _tags_from_list(tags_list):
     """Return the list of tags from a list of tag parameter values.
 
@@ -784,6 +814,6 @@ def _tags_from_list(tags_list):
 
 def set_options(argstr=''):
     """Populate the config module variables with the default options."""
-    parser = _make_parser()
+    parser = _get_parser()
     options, _args = parser.parse_args(args=shlex.split(argstr))
     _update_config_vars(options)
@@ -2,9 +2,10 @@
 
 import unittest
 
+from buildscripts.resmokelib import config as _config
 from buildscripts.resmokelib import parser as _parser
 
-# pylint: disable=missing-docstring
+# pylint: disable=missing-docstring,protected-access
 
 
 class TestLocalCommandLine(unittest.TestCase):
@@ -244,3 +245,40 @@ class TestLocalCommandLine(unittest.TestCase):
         ])
 
         self.assertEqual(cmdline, ["--suites=my_suite", "--storageEngine=my_storage_engine"])
+
+
+class TestGetParser(unittest.TestCase):
+    """Unit tests for the _get_parser() function."""
+
+    def test_reuses_parser(self):
+        self.assertIs(_parser._get_parser(), _parser._get_parser())
+
+    def test_parses_each_command_line_independently(self):
+        parser = _parser._get_parser()
+        options, _ = parser.parse_args(["--suites=my_suite", "--excludeWithAnyTags=tag1"])
+        self.assertEqual(options.suite_files, "my_suite")
+        self.assertEqual(options.exclude_with_any_tags, ["tag1"])
+
+        options, _ = parser.parse_args([])
+        self.assertEqual(options.suite_files, "with_server")
+        self.assertIsNone(options.exclude_with_any_tags)
+
+
+class TestSetOptions(unittest.TestCase):
+    """Unit tests for the set_options() function."""
+
+    def setUp(self):
+        self.addCleanup(_parser.set_options)
+
+    def test_parses_set_parameters_once(self):
+        _parser.set_options("--mongodSetParameters='{enableTestCommands: 1}'"
+                            " --mongosSetParameters='{logLevel: 2, traceExceptions: true}'")
+
+        self.assertEqual(_config.MONGOD_SET_PARAMETERS, {"enableTestCommands": 1})
+        self.assertEqual(_config.MONGOS_SET_PARAMETERS, {"logLevel": 2, "traceExceptions": True})
+
+    def test_set_parameters_not_specified(self):
+        _parser.set_options()
+
+        self.assertIsNone(_config.MONGOD_SET_PARAMETERS)
+        self.assertIsNone(_config.MONGOS_SET_PARAMETERS)
@@ -351,39 +351,16 @@ class TestConfigOptions(unittest.TestCase):
         self.assertEqual(1, config_options.number)
         self.assertIsInstance(config_options.number, int)
 
+    def test_item_with_format_function_is_only_formatted_once(self):
+        config = {"number": "1"}
+        format_mock = MagicMock(return_value=1)
+        formats = {"number": format_mock}
 
-class DivideRemainingTestsAmongSuitesTest(unittest.TestCase):
-    @staticmethod
-    def generate_tests_runtimes(n_tests):
-        tests_runtimes = []
-        # Iterating backwards so the list is sorted by descending runtimes
-        for idx in range(n_tests - 1, -1, -1):
-            name = "test_{0}".format(idx)
-            tests_runtimes.append((name, 2 * idx))
-
-        return tests_runtimes
-
-    def test_each_suite_gets_one_test(self):
-        suites = [under_test.Suite(f"suite_{i}") for i in range(3)]
-        tests_runtimes = self.generate_tests_runtimes(3)
-
-        under_test.divide_remaining_tests_among_suites(tests_runtimes, suites)
-
-        for suite in suites:
-            self.assertEqual(suite.get_test_count(), 1)
-
-    def test_each_suite_gets_at_least_one_test(self):
-        suites = [under_test.Suite(f"suite_{i}") for i in range(3)]
-        tests_runtimes = self.generate_tests_runtimes(5)
-
-        under_test.divide_remaining_tests_among_suites(tests_runtimes, suites)
-
-        total_tests = 0
-        for suite in suites:
-            total_tests += suite.get_test_count()
-            self.assertGreaterEqual(suite.get_test_count(), 1)
+        config_options = under_test.ConfigOptions(config, formats=formats)
 
-        self.assertEqual(total_tests, len(tests_runtimes))
+        self.assertEqual(1, config_options.number)
+        self.assertEqual(1, config_options.number)
+        format_mock.assert_called_once_with("1")
 
 
 class DivideTestsIntoSuitesByMaxtimeTest(unittest.TestCase):
@@ -474,6 +451,59 @@ class DivideTestsIntoSuitesByMaxtimeTest(unittest.TestCase):
 
         self.assertEqual(len(suites), max_suites)
 
+    def test_longest_tests_are_divided_first(self):
+        max_time = 10
+        tests_runtimes = [
+            ("test1", 1),
+            ("test2", 1),
+            ("test3", 1),
+            ("test4", 1),
+            ("test5", 8),
+            ("test6", 8),
+        ]
+
+        suites = under_test.divide_tests_into_suites("suite_name", tests_runtimes, max_time)
+
+        self.assertEqual(len(suites), 2)
+        for suite in suites:
+            self.assertEqual(suite.get_test_count(), 3)
+            self.assertEqual(suite.get_runtime(), 10)
+
+    def test_remaining_tests_go_to_smallest_suite_when_max_suites_hit(self):
+        max_time = 5
+        # Use more suites than are divided by differencing, so the remaining tests are added to the
+        # smallest suites.
+        max_suites = under_test.MAX_SUITES_FOR_DIFFERENCING + 1
+        tests_runtimes = [(f"test{i}", 5) for i in range(max_suites)]
+        tests_runtimes += [("test_small1", 1), ("test_small2", 1), ("test_medium", 3)]
+
+        with patch(ns("_divide_tests_by_differencing")) as divide_by_differencing_mock:
+            suites = under_test.divide_tests_into_suites("suite_name", tests_runtimes, max_time,
+                                                         max_suites=max_suites)
+
+        divide_by_differencing_mock.assert_not_called()
+        self.assertEqual(len(suites), max_suites)
+        self.assertEqual(sum(suite.get_test_count() for suite in suites), len(tests_runtimes))
+        self.assertEqual(sorted(suite.get_runtime() for suite in suites), [5, 5, 6, 6, 8])
+
+    def test_small_max_suites_are_divided_by_differencing(self):
+        max_time = 5
+        max_suites = 2
+        tests_runtimes = [
+            ("test1", 8),
+            ("test2", 7),
+            ("test3", 6),
+            ("test4", 5),
+            ("test5", 4),
+        ]
+
+        suites = under_test.divide_tests_into_suites("suite_name", tests_runtimes, max_time,
+                                                     max_suites=max_suites)
+
+        self.assertEqual(len(suites), max_suites)
+        self.assertEqual(sum(suite.get_test_count() for suite in suites), len(tests_runtimes))
+        self.assertEqual(sorted(suite.get_runtime() for suite in suites), [14, 16])
+
 
 class SuiteTest(unittest.TestCase):
     def test_adding_tests_increases_count_and_runtime(self):
@@ -505,10 +535,20 @@ class SuiteTest(unittest.TestCase):
     def test_suite_name(self):
         suite = under_test.Suite("suite_name")
         suite.index = 3
-        under_test.Suite._current_index = 314
+        suite.set_name(314)
 
         self.assertEqual("suite_name_003", suite.name)
 
+    def test_suite_names_do_not_change_when_more_suites_are_created(self):
+        under_test.Suite.reset_current_index()
+        suites = under_test.name_suites(
+            [under_test.Suite("suite_name"),
+             under_test.Suite("suite_name")])
+        for _ in range(10):
+            under_test.Suite("other_suite")
+
+        self.assertEqual(["suite_name_0", "suite_name_1"], [suite.name for suite in suites])
+
 
 def create_suite(count=3, start=0):
     """ Create a suite with count tests."""
@@ -546,6 +586,24 @@ class UpdateSuiteConfigTest(unittest.TestCase):
             self.assertIn(exclude, updated_config["selector"]["exclude_files"])
 
 
+class GenerateResmokeSuiteConfigTest(unittest.TestCase):
+    def test_source_config_is_not_modified(self):
+        source_config = {
+            "test_kind": "js_test",
+            "selector": {"roots": ["test0"], "exclude_files": ["file 0"]},
+            "executor": {"config": {"shell_options": {"readMode": "commands"}}},
+        }
+
+        contents = under_test.generate_resmoke_suite_config(source_config, "source_file",
+                                                            excludes=["file 1"])
+
+        generated_config = yaml.safe_load(contents)
+        self.assertEqual(["file 0", "file 1"], generated_config["selector"]["exclude_files"])
+        self.assertEqual(source_config["executor"], generated_config["executor"])
+        self.assertEqual({"roots": ["test0"], "exclude_files": ["file 0"]},
+                         source_config["selector"])
+
+
 class CalculateTimeoutTest(unittest.TestCase):
     def test_min_timeout(self):
         self.assertEqual(under_test.MIN_TIMEOUT_SECONDS + under_test.AVG_SETUP_TIME,
@@ -652,14 +710,34 @@ class EvergreenConfigGeneratorTest(unittest.TestCase):
                          config["buildvariants"][0]["tasks"][0]["distros"][0])
 
     def test_selecting_tasks(self):
-        is_task_dependency = under_test.EvergreenConfigGenerator._is_task_dependency
-        self.assertFalse(is_task_dependency("sharding", "sharding"))
-        self.assertFalse(is_task_dependency("sharding", "other_task"))
-        self.assertFalse(is_task_dependency("sharding", "sharding_gen"))
+        options = self.generate_mock_options()
+        suites = self.generate_mock_suites(3)
 
-        self.assertTrue(is_task_dependency("sharding", "sharding_0"))
-        self.assertTrue(is_task_dependency("sharding", "sharding_314"))
-        self.assertTrue(is_task_dependency("sharding", "sharding_misc"))
+        cfg_generator = under_test.EvergreenConfigGenerator(suites, options, MagicMock())
+        cfg_generator.build_tasks = [
+            MagicMock(display_name="sharding"),
+            MagicMock(display_name="other_task"),
+            MagicMock(display_name="sharding_gen"),
+            MagicMock(display_name="sharding_0"),
+            MagicMock(display_name="sharding_314"),
+            MagicMock(display_name="sharding_misc"),
+        ]
+
+        dependent_tasks = cfg_generator._get_tasks_for_depends_on("sharding")
+        self.assertEqual(["sharding_0", "sharding_314", "sharding_misc"], dependent_tasks)
+
+    def test_selecting_tasks_with_regex_characters_in_name(self):
+        options = self.generate_mock_options()
+        suites = self.generate_mock_suites(3)
+
+        cfg_generator = under_test.EvergreenConfigGenerator(suites, options, MagicMock())
+        cfg_generator.build_tasks = [
+            MagicMock(display_name="sharding_jscore_0"),
+            MagicMock(display_name="sharding.jscore_0"),
+        ]
+
+        dependent_tasks = cfg_generator._get_tasks_for_depends_on("sharding.jscore")
+        self.assertEqual(["sharding.jscore_0"], dependent_tasks)
 
     def test_get_tasks_depends_on(self):
         options = self.generate_mock_options()
@@ -702,6 +780,30 @@ class EvergreenConfigGeneratorTest(unittest.TestCase):
         dependencies = cfg_generator._get_dependencies()
         self.assertEqual(4, len(dependencies))
 
+    def test_build_tasks_are_only_scanned_once_for_dependencies(self):
+        options = self.generate_mock_options()
+        options.depends_on = ["sharding"]
+        options.is_patch = False
+        suites = self.generate_mock_suites(3)
+
+        cfg_generator = under_test.EvergreenConfigGenerator(suites, options, MagicMock())
+        cfg_generator.build_tasks = [
+            MagicMock(display_name="sharding_0"),
+            MagicMock(display_name="other_task"),
+            MagicMock(display_name="sharding_misc"),
+        ]
+
+        task_dependency_pattern = under_test.EvergreenConfigGenerator._task_dependency_pattern
+        with patch.object(under_test.EvergreenConfigGenerator, "_task_dependency_pattern",
+                          wraps=task_dependency_pattern) as task_dependency_pattern_mock:
+            cfg_generator._get_dependencies()
+            dependencies = cfg_generator._get_dependencies()
+
+        self.assertEqual(3, len(dependencies))
+        self.assertIn(under_test.TaskDependency("sharding_0"), dependencies)
+        self.assertIn(under_test.TaskDependency("sharding_misc"), dependencies)
+        task_dependency_pattern_mock.assert_called_once_with("sharding")
+
     def test_evg_config_has_timeouts_for_repeated_suites(self):
         options = self.generate_mock_options()
         options.repeat_suites = 5
@@ -987,7 +1089,7 @@ class GenerateSubSuitesTest(unittest.TestCase):
             gen_sub_suites = under_test.GenerateSubSuites(evg, config_options)
 
             with patch("os.path.exists") as exists_mock:
-                exists_mock.side_effect = [False, True, True]
+                exists_mock.side_effect = lambda path: path != tests_runtimes[0].test_name
                 filtered_list = gen_sub_suites.filter_existing_tests(tests_runtimes)
 
             self.assertEqual(2, len(filtered_list))
@@ -1045,8 +1147,48 @@ class GenerateSubSuitesTest(unittest.TestCase):
             self.assertIn(tests_runtimes[0], filtered_list)
             self.assertEqual(2, len(filtered_list))
 
+    def test_filter_only_checks_existence_of_tests_in_suite(self):
+        tests_runtimes = [
+            TestRuntime(test_name="dir1/file1.js", runtime=20.32),
+            TestRuntime(test_name="dir2/file2.js", runtime=24.32),
+        ]
+
+        with patch("os.path.exists") as exists_mock, patch(ns("suitesconfig")) as suitesconfig_mock:
+            exists_mock.return_value = True
+            evg = MagicMock()
+            suitesconfig_mock.get_suite.return_value.tests = ["dir1/file1.js"]
+            config_options = MagicMock(suite="suite")
+
+            gen_sub_suites = under_test.GenerateSubSuites(evg, config_options)
+            filtered_list = gen_sub_suites.filter_existing_tests(tests_runtimes)
+
+            self.assertEqual([tests_runtimes[0]], filtered_list)
+            exists_mock.assert_called_once_with("dir1/file1.js")
+
+    def test_list_tests_only_reads_suite_once(self):
+        with patch(ns("suitesconfig")) as suitesconfig_mock:
+            evg = MagicMock()
+            suitesconfig_mock.get_suite.return_value.tests = ["dir1/file1.js", "dir2/file2.js"]
+            config_options = MagicMock(suite="suite")
+
+            gen_sub_suites = under_test.GenerateSubSuites(evg, config_options)
+            gen_sub_suites.list_tests()
+            test_list = gen_sub_suites.list_tests()
+
+            self.assertEqual(["dir1/file1.js", "dir2/file2.js"], test_list)
+            suitesconfig_mock.get_suite.assert_called_once_with("suite")
+
 
 class TestShouldTasksBeGenerated(unittest.TestCase):
+    def test_missing_previous_executions_are_ignored(self):
+        evg_api = MagicMock()
+        task_id = "task_id"
+        task = evg_api.task_by_id.return_value
+        task.execution = 2
+        task.get_execution.return_value = None
+
+        self.assertTrue(under_test.should_tasks_be_generated(evg_api, task_id))
+
     def test_during_first_execution(self):
         evg_api = MagicMock()
         task_id = "task_id"
@@ -0,0 +1,77 @@
+"""Unit tests for the util/fileops.py script."""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import stat
+import sys
+from tempfile import TemporaryDirectory
+import unittest
+
+from mock import patch
+
+from buildscripts.util import fileops as under_test
+
+# pylint: disable=missing-docstring,protected-access
+
+
+class TestWriteFile(unittest.TestCase):
+    def test_contents_are_written(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "file.yml")
+
+            under_test.write_file(path, "contents")
+
+            with open(path) as file_handle:
+                self.assertEqual("contents", file_handle.read())
+            self.assertEqual(["file.yml"], os.listdir(tmpdir))
+
+    def test_existing_file_is_replaced(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "file.yml")
+            under_test.write_file(path, "old contents that are longer")
+
+            under_test.write_file(path, "new contents")
+
+            with open(path) as file_handle:
+                self.assertEqual("new contents", file_handle.read())
+            self.assertEqual(["file.yml"], os.listdir(tmpdir))
+
+    def test_failed_write_keeps_old_file(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "file.yml")
+            under_test.write_file(path, "old contents")
+
+            with patch(under_test.__name__ + ".os.replace", side_effect=OSError("failed")):
+                with self.assertRaises(OSError):
+                    under_test.write_file(path, "new contents")
+
+            with open(path) as file_handle:
+                self.assertEqual("old contents", file_handle.read())
+            self.assertEqual(["file.yml"], os.listdir(tmpdir))
+
+    def test_concurrent_writers_do_not_share_temporary_file(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "file.yml")
+            all_contents = [f"contents {i}" * 1000 for i in range(20)]
+
+            with ThreadPoolExecutor(max_workers=len(all_contents)) as executor:
+                list(
+                    executor.map(lambda contents: under_test.write_file(path, contents),
+                                 all_contents))
+
+            with open(path) as file_handle:
+                self.assertIn(file_handle.read(), all_contents)
+            self.assertEqual(["file.yml"], os.listdir(tmpdir))
+
+    @unittest.skipIf(sys.platform == "win32", "POSIX file permissions are not used on Windows")
+    def test_file_permissions_follow_current_umask(self):
+        with TemporaryDirectory() as tmpdir:
+            for umask, expected_mode in [(0o022, 0o644), (0o077, 0o600), (0o002, 0o664)]:
+                path = os.path.join(tmpdir, "file_{:o}.yml".format(umask))
+                old_umask = os.umask(umask)
+                try:
+                    under_test.write_file(path, "contents")
+                finally:
+                    os.umask(old_umask)
+
+                self.assertEqual(expected_mode, stat.S_IMODE(os.stat(path).st_mode))
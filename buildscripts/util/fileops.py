@@ -1,6 +1,11 @@
 """Utility to support file operations."""
 
 import os
+import uuid
+
+# The flags used to exclusively create the temporary file written by write_file(). O_BINARY is only
+# defined on Windows, where it stops the file descriptor from translating newlines a second time.
+_TMP_FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
 
 
 def create_empty(path):
@@ -31,11 +36,24 @@ def write_file(path: str, contents: str) -> None:
     """
     Write the contents provided to the file in the specified path.
 
+    The contents are written to a uniquely named temporary file which then replaces the file at
+    'path', so readers never see a partially written file, even with several concurrent writers.
+
     :param path: Path of file to write.
     :param contents: Contents to write to file.
     """
-    with open(path, "w") as file_handle:
-        file_handle.write(contents)
+    tmp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+    # Unlike tempfile.mkstemp(), which only makes files readable by their owner, this lets the
+    # current umask decide the permissions of the file, the same as open() does.
+    file_descriptor = os.open(tmp_path, _TMP_FILE_FLAGS, 0o666)
+    try:
+        with os.fdopen(file_descriptor, "w") as file_handle:
+            file_handle.write(contents)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 
 def write_file_to_dir(directory: str, file: str, contents: str) -> None: